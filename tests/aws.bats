@@ -10,6 +10,10 @@ CLUSTER_NAME=integ-cluster
 POD_NAME=basic-test-mount
 export REGION=us-west-2
 export FAILOVERREGION=us-east-2
+#Retry tuning for the aws CLI calls issued by this suite; adaptive mode
+#backs off client-side when the parallel setup calls hit API throttling.
+export AWS_RETRY_MODE=adaptive
+export AWS_MAX_ATTEMPTS=10
 export ACCOUNT_NUMBER=$(aws --region $REGION  sts get-caller-identity --query Account --output text)
 
 if [[ -z "${PRIVREPO}" ]]; then
@@ -20,9 +24,94 @@ fi
 if [[ -z "${NODE_TYPE}" ]]; then
     NODE_TYPE=m5.large
 fi
+
+#Test resources, as "name=value" pairs. Defined once at file scope so
+#setup_file and teardown_file work from the same list.
+TEST_SECRETS=(
+   "SecretsManagerTest1=SecretsManagerTest1Value"
+   "SecretsManagerTest2=SecretsManagerTest2Value"
+   "SecretsManagerSync=SecretUser"
+   "SecretsManagerRotationTest=BeforeRotation"
+   'secretsManagerJson={"username": "SecretsManagerUser", "password": "PasswordForSecretsManager"}'
+)
+
+TEST_PARAMETERS=(
+   "ParameterStoreTest1=ParameterStoreTest1Value"
+   "ParameterStoreTestWithLongName=ParameterStoreTest2Value"
+   "ParameterStoreRotationTest=BeforeRotation"
+   'jsonSsm={"username": "ParameterStoreUser", "password": "PasswordForParameterStore"}'
+)
   
+#Fallback for a failed create-secret: the secret usually already exists, but
+#one scheduled for deletion (a teardown without --force-delete-without-recovery)
+#also rejects creates until it is restored. An existing secret may hold a
+#stale value from a previous run's rotation tests, so reset it to the
+#expected value rather than just probing for existence.
+recover_existing_secret() {
+   secret_id="$1"
+   region="$2"
+   value="$3"
+
+   deleted_date=$(aws secretsmanager describe-secret --secret-id "$secret_id" --region "$region" --query DeletedDate --output text) || return
+
+   if [[ "$deleted_date" != "None" ]]; then
+      aws secretsmanager restore-secret --secret-id "$secret_id" --region "$region" > /dev/null || return
+   fi
+
+   #A restored secret comes back with the value it held when it was scheduled
+   #for deletion, so the reset applies to the restore path as well.
+   aws secretsmanager put-secret-value --secret-id "$secret_id" --secret-string "$value" --region "$region" > /dev/null
+}
+
+create_test_resources() {
+   #Each resource is listed once; the loop fans it out to the primary and
+   #failover regions. The calls are independent, so run them in the background
+   #and wait for the batch. fd 3 must be closed or bats will hang waiting on
+   #the background processes.
+   #Each call logs to its own file and the logs are replayed after the batch,
+   #so output from the background jobs does not interleave.
+   #Create optimistically: the common case is that the resource does not
+   #exist, so the recovery path only runs as a fallback when the create
+   #fails (e.g. a rerun after a failed teardown) instead of costing an extra
+   #round trip on every resource. Parameters use --overwrite so one call both
+   #creates and resets any stale value from a previous run's rotation tests.
+   log_dir=$(mktemp -d)
+   pids=()
+   for region in $REGION $FAILOVERREGION; do
+      for secret in "${TEST_SECRETS[@]}"; do
+         name=${secret%%=*}
+         { aws secretsmanager create-secret --name "$name" --secret-string "${secret#*=}" --region $region \
+              || recover_existing_secret "$name" $region "${secret#*=}"; } > "$log_dir/create-$name-$region.log" 2>&1 3>&- &
+         pids+=($!)
+      done
+
+      for parameter in "${TEST_PARAMETERS[@]}"; do
+         name=${parameter%%=*}
+         aws ssm put-parameter --name "$name" --value "${parameter#*=}" --type SecureString --overwrite --region $region > "$log_dir/put-$name-$region.log" 2>&1 3>&- &
+         pids+=($!)
+      done
+   done
+
+   #Wait on each job individually so a failed create still fails setup
+   #instead of disappearing into a bare wait's zero exit status.
+   failed=
+   for pid in "${pids[@]}"; do
+      wait "$pid" || failed=1
+   done
+
+   cat "$log_dir"/*.log
+   rm -rf "$log_dir"
+   [[ -z "$failed" ]]
+}
+
 setup_file() {
-    #Create and initialize cluster 
+    #Create test secrets. Resource creation only needs AWS credentials, not
+    #the cluster, so it runs in the background while eksctl provisions and is
+    #awaited at the end of setup.
+    create_test_resources 3>&- &
+    resources_pid=$!
+
+    #Create and initialize cluster
     eksctl create cluster \
        --name $CLUSTER_NAME \
        --node-type $NODE_TYPE \
@@ -44,29 +133,8 @@ setup_file() {
    #Install csi secret driver
    helm repo add secrets-store-csi-driver https://kubernetes-sigs.github.io/secrets-store-csi-driver/charts
    helm --namespace=$NAMESPACE install csi-secrets-store secrets-store-csi-driver/secrets-store-csi-driver --set enableSecretRotation=true --set rotationPollInterval=15s --set syncSecret.enabled=true
- 
-   #Create test secrets
-   aws secretsmanager create-secret --name SecretsManagerTest1 --secret-string SecretsManagerTest1Value --region $REGION
-   aws secretsmanager create-secret --name SecretsManagerTest2 --secret-string SecretsManagerTest2Value --region $REGION
-   aws secretsmanager create-secret --name SecretsManagerSync --secret-string SecretUser --region $REGION
-   aws secretsmanager create-secret --name SecretsManagerTest1 --secret-string SecretsManagerTest1Value --region $FAILOVERREGION
-   aws secretsmanager create-secret --name SecretsManagerTest2 --secret-string SecretsManagerTest2Value --region $FAILOVERREGION
-   aws secretsmanager create-secret --name SecretsManagerSync --secret-string SecretUser --region $FAILOVERREGION
- 
-   aws ssm put-parameter --name ParameterStoreTest1 --value ParameterStoreTest1Value --type SecureString --region $REGION
-   aws ssm put-parameter --name ParameterStoreTestWithLongName --value ParameterStoreTest2Value --type SecureString --region $REGION
-   aws ssm put-parameter --name ParameterStoreTest1 --value ParameterStoreTest1Value --type SecureString --region $FAILOVERREGION
-   aws ssm put-parameter --name ParameterStoreTestWithLongName --value ParameterStoreTest2Value --type SecureString --region $FAILOVERREGION
- 
-   aws ssm put-parameter --name ParameterStoreRotationTest --value BeforeRotation --type SecureString --region $REGION
-   aws secretsmanager create-secret --name SecretsManagerRotationTest --secret-string BeforeRotation --region $REGION
-   aws ssm put-parameter --name ParameterStoreRotationTest --value BeforeRotation --type SecureString --region $FAILOVERREGION
-   aws secretsmanager create-secret --name SecretsManagerRotationTest --secret-string BeforeRotation --region $FAILOVERREGION
 
-   aws secretsmanager create-secret --name secretsManagerJson  --secret-string '{"username": "SecretsManagerUser", "password": "PasswordForSecretsManager"}' --region $REGION
-   aws ssm put-parameter --name jsonSsm --value '{"username": "ParameterStoreUser", "password": "PasswordForParameterStore"}' --type SecureString --region $REGION
-   aws secretsmanager create-secret --name secretsManagerJson  --secret-string '{"username": "SecretsManagerUser", "password": "PasswordForSecretsManager"}' --region $FAILOVERREGION
-   aws ssm put-parameter --name jsonSsm --value '{"username": "ParameterStoreUser", "password": "PasswordForParameterStore"}' --type SecureString --region $FAILOVERREGION
+   wait $resources_pid || { echo "Error: test resource creation failed" >&2; return 1; }
 }
  
 teardown_file() { 
@@ -75,27 +143,34 @@ teardown_file() {
         --name $CLUSTER_NAME \
         --region $REGION
  
-    aws secretsmanager delete-secret --secret-id SecretsManagerTest1 --force-delete-without-recovery --region $REGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerTest2 --force-delete-without-recovery --region $REGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerSync --force-delete-without-recovery --region $REGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerTest1 --force-delete-without-recovery --region $FAILOVERREGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerTest2 --force-delete-without-recovery --region $FAILOVERREGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerSync --force-delete-without-recovery --region $FAILOVERREGION
- 
-    aws ssm delete-parameter --name ParameterStoreTest1 --region $REGION
-    aws ssm delete-parameter --name ParameterStoreTestWithLongName --region $REGION 
-    aws ssm delete-parameter --name ParameterStoreTest1 --region $FAILOVERREGION
-    aws ssm delete-parameter --name ParameterStoreTestWithLongName --region $FAILOVERREGION 
- 
-    aws ssm delete-parameter --name ParameterStoreRotationTest --region $REGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerRotationTest --force-delete-without-recovery --region $REGION
-    aws ssm delete-parameter --name ParameterStoreRotationTest --region $FAILOVERREGION
-    aws secretsmanager delete-secret --secret-id SecretsManagerRotationTest --force-delete-without-recovery --region $FAILOVERREGION
+    #Each resource is listed once; the loop fans the deletes out to the primary
+    #and failover regions. Deletes are independent, so run them in the
+    #background and wait for the batch.
+    #Per-call log files keep the background jobs' output from interleaving.
+    log_dir=$(mktemp -d)
+    pids=()
+    for region in $REGION $FAILOVERREGION; do
+       for secret in "${TEST_SECRETS[@]}"; do
+          aws secretsmanager delete-secret --secret-id "${secret%%=*}" --force-delete-without-recovery --region $region > "$log_dir/delete-${secret%%=*}-$region.log" 2>&1 3>&- &
+          pids+=($!)
+       done
+
+       for parameter in "${TEST_PARAMETERS[@]}"; do
+          aws ssm delete-parameter --name "${parameter%%=*}" --region $region > "$log_dir/delete-${parameter%%=*}-$region.log" 2>&1 3>&- &
+          pids+=($!)
+       done
+    done
+
+    #Wait on each job individually so a failed delete still fails teardown
+    #instead of disappearing into a bare wait's zero exit status.
+    failed=
+    for pid in "${pids[@]}"; do
+       wait "$pid" || failed=1
+    done
 
-    aws ssm delete-parameter --name jsonSsm --region $REGION
-    aws secretsmanager delete-secret --secret-id secretsManagerJson --force-delete-without-recovery --region $REGION
-    aws ssm delete-parameter --name jsonSsm --region $FAILOVERREGION
-    aws secretsmanager delete-secret --secret-id secretsManagerJson --force-delete-without-recovery --region $FAILOVERREGION
+    cat "$log_dir"/*.log
+    rm -rf "$log_dir"
+    [[ -z "$failed" ]]
 }
 
 validate_jsme_mount() {
@@ -119,7 +194,7 @@ validate_jsme_mount() {
 }
  
 @test "Install aws provider" {
-    envsubst < $PROVIDER_YAML | kubectl apply -f - 
+    envsubst '$PRIVREPO' < $PROVIDER_YAML | kubectl apply -f -
     cmd="kubectl --namespace $NAMESPACE wait --for=condition=Ready --timeout=60s pod -l app=csi-secrets-store-provider-aws"
     wait_for_process $WAIT_TIME $SLEEP_TIME "$cmd"
  
@@ -137,7 +212,7 @@ validate_jsme_mount() {
 }
  
 @test "deploy aws secretproviderclass crd" {
-    envsubst < BasicTestMountSPC.yaml | kubectl --namespace $NAMESPACE apply -f -
+    envsubst '$REGION $FAILOVERREGION $ACCOUNT_NUMBER' < BasicTestMountSPC.yaml | kubectl --namespace $NAMESPACE apply -f -
  
     cmd="kubectl --namespace $NAMESPACE get secretproviderclasses.secrets-store.csi.x-k8s.io/basic-test-mount-spc -o yaml | grep aws"
     wait_for_process $WAIT_TIME $SLEEP_TIME "$cmd"